@@ -2,43 +2,77 @@ import os
 
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = '/workspaces/slownewsinthai/.secrets/total-pier-425200-f4-a424dd7f6f3a.json'
 
-from flask import Flask, request, jsonify, render_template, url_for, send_file, send_from_directory
+from flask import Flask, Response, g, redirect, request, jsonify, render_template, url_for, send_file, send_from_directory
 from flask_caching import Cache
 import time
 import logging
 import os
 import glob
-import feedparser
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
-from automation import AUDIO_DIR, compile_daily_post, text_to_speech, run_daily_automation
+from automation import AUDIO_DIR, audio_store
+from article_fetcher import article_fetcher
+from daily_summary import daily_summary_service
+from feed_ingestor import feed_ingestor
+from metrics import HTTP_REQUEST_SECONDS, render as render_metrics
+from mp3_audio import open_live_episode, stream_live_episode
+from translation import process_article
+from prometheus_client import CONTENT_TYPE_LATEST
 
 # Load environment variables
 load_dotenv()
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder='static', template_folder='.')
 cache = Cache(app, config={'CACHE_TYPE': 'simple'})
 
-# Try to import Celery, but don't fail if it's not available
-try:
-    from celery import group
-    from celery_worker import process_article
-    CELERY_AVAILABLE = True
-except ImportError:
-    CELERY_AVAILABLE = False
+# Celery is only imported once /process actually needs the broker, but don't fail if it's not installed
+CELERY_AVAILABLE = importlib.util.find_spec('celery') is not None
+if not CELERY_AVAILABLE:
     logger.warning("Celery is not available. Running in non-distributed mode.")
 
+# /process gives up on articles that aren't done by this deadline
+PROCESS_DEADLINE_SECONDS = float(os.environ.get('PROCESS_DEADLINE_SECONDS', 30))
+PROCESS_LOCAL_WORKERS = int(os.environ.get('PROCESS_LOCAL_WORKERS', 8))
+# Articles queued or running in-process at once; past this, new ones are turned away rather than queued
+PROCESS_LOCAL_BACKLOG = int(os.environ.get('PROCESS_LOCAL_BACKLOG', PROCESS_LOCAL_WORKERS * 4))
+
+# How long a broker reachability (and live worker) check is trusted before trying again
+BROKER_CHECK_INTERVAL = 30
+WORKER_PING_TIMEOUT = float(os.environ.get('WORKER_PING_TIMEOUT', 1.0))
+
+local_executor = ThreadPoolExecutor(max_workers=PROCESS_LOCAL_WORKERS, thread_name_prefix='process-article')
+broker_status = {'checked_at': 0.0, 'available': False}
+local_status = {'pending': 0}
+local_lock = threading.Lock()
+
 # Set Google Application Credentials
 if 'GOOGLE_APPLICATION_CREDENTIALS' in os.environ:
     print(f"Using Google credentials from: {os.environ['GOOGLE_APPLICATION_CREDENTIALS']}")
 else:
     print("GOOGLE_APPLICATION_CREDENTIALS environment variable not set")
 
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -47,75 +81,174 @@ def index():
 @cache.cached(timeout=300)
 def get_articles():
     articles = fetch_rss_feed()
-    print(f"Fetched {len(articles)} articles")  # Add this line
-    return jsonify([{'title': article['title'], 'summary': article['summary'], 'content': article['content'], 'link': article['link']} for article in articles[:10]])
+    logger.info("Fetched %d articles", len(articles))
+    return jsonify([{'id': article['id'], 'title': article['title'], 'summary': article['summary'], 'content': article['content'], 'link': article['link']} for article in articles[:10]])
 
 @app.route('/process', methods=['POST'])
 def process():
     try:
-        selected_indices = request.json['articles']
-        articles = fetch_rss_feed()
-        selected_articles = [{'title': articles[int(i)]['title'], 'summary': articles[int(i)]['summary'], 'content': articles[int(i)]['content'], 'link': articles[int(i)]['link']} for i in selected_indices]
+        selected = request.json['articles']
+        articles = None
+        selected_articles = []
+        for key in selected:
+            # Article IDs resolve against the snapshot the client saw; bare indices are still accepted
+            if isinstance(key, int) or (isinstance(key, str) and key.isdigit()):
+                if articles is None:
+                    # Only indices need the current feed order
+                    articles = fetch_rss_feed()
+                article = articles[int(key)]
+            else:
+                entry = feed_ingestor.get(key)
+                if entry is None:
+                    return jsonify({"error": f"Unknown article id: {key}"}), 404
+                article = article_from_entry(entry)
+            selected_articles.append({'title': article['title'], 'summary': article['summary'], 'content': article['content'], 'link': article['link']})
+
+        if request.json.get('full_content'):
+            # Summarize the real article bodies instead of the RSS descriptions
+            bodies = article_fetcher.fetch_many([article['link'] for article in selected_articles])
+            for article, body in zip(selected_articles, bodies):
+                if body:
+                    article['content'] = body
 
-        print(f"Processing {len(selected_articles)} articles")  # Debug print
+        logger.info("Processing %d articles", len(selected_articles))
+
+        deadline = time.monotonic() + PROCESS_DEADLINE_SECONDS
+        if broker_available():
+            outcomes = dispatch_with_celery(selected_articles, deadline)
+        else:
+            outcomes = dispatch_locally(selected_articles, deadline)
 
         processed_articles = []
         errors = []
-        for article in selected_articles:
-            try:
-                processed = process_article(article)
-                print(f"Processed article: {processed['translated_title']}")  # Debug print
-                processed_articles.append(processed)
-            except Exception as e:
-                error_msg = f"Error processing article '{article['title']}': {str(e)}"
-                print(error_msg)  # Debug print
+        results = []
+        for article, (status, value) in zip(selected_articles, outcomes):
+            if status == 'ok':
+                logger.debug("Processed article: %s", value['translated_title'])
+                processed_articles.append(value)
+                results.append({'link': article['link'], 'status': status, 'article': value})
+            else:
+                error_msg = f"Error processing article '{article['title']}': {value}"
+                logger.warning(error_msg)
                 errors.append(error_msg)
+                results.append({'link': article['link'], 'status': status, 'error': value})
 
         if not processed_articles and errors:
-            return jsonify({"error": "Errors occurred while processing articles", "details": errors}), 500
+            return jsonify({"error": "Errors occurred while processing articles", "details": errors, "results": results}), 500
 
-        return jsonify({"processed": processed_articles, "errors": errors})
+        return jsonify({"processed": processed_articles, "errors": errors, "results": results})
     except Exception as e:
         print(f"Error in /process route: {str(e)}")  # Debug print
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+def broker_available():
+    if not CELERY_AVAILABLE:
+        return False
+    now = time.monotonic()
+    if now - broker_status['checked_at'] < BROKER_CHECK_INTERVAL:
+        return broker_status['available']
+    try:
+        from celery_worker import celery
+        with celery.connection_for_write() as conn:
+            conn.ensure_connection(max_retries=1, interval_start=0, timeout=1)
+        # A reachable broker with no worker consuming it would leave every task waiting out the deadline
+        available = bool(celery.control.ping(timeout=WORKER_PING_TIMEOUT, limit=1))
+        if not available:
+            logger.warning("No Celery workers responded, processing articles in-process")
+    except Exception as e:
+        logger.warning(f"Celery broker unreachable, processing articles in-process: {str(e)}")
+        available = False
+    broker_status.update(checked_at=now, available=available)
+    return available
+
+def dispatch_with_celery(articles, deadline):
+    from celery import group
+    from celery.exceptions import TimeoutError as CeleryTimeoutError
+    from celery_worker import celery, process_article as process_article_task
+    job = group(process_article_task.s(article) for article in articles).apply_async()
+    outcomes = []
+    timed_out = []
+    # Results are collected against one shared deadline, so the wait is bounded by the slowest article
+    for result in job.results:
+        try:
+            outcomes.append(('ok', result.get(timeout=max(deadline - time.monotonic(), 0.01))))
+        except CeleryTimeoutError:
+            outcomes.append(('timeout', "Timed out waiting for worker"))
+            timed_out.append(result.id)
+        except Exception as e:
+            outcomes.append(('error', str(e)))
+    if timed_out:
+        # Nobody is waiting for these any more; don't let a worker pick them up later
+        celery.control.revoke(timed_out)
+        # Workers may have gone away since the last check
+        broker_status['checked_at'] = 0.0
+    return outcomes
+
+def release_local_slot(future):
+    with local_lock:
+        local_status['pending'] -= 1
+
+def dispatch_locally(articles, deadline):
+    futures = []
+    for article in articles:
+        with local_lock:
+            if local_status['pending'] >= PROCESS_LOCAL_BACKLOG:
+                futures.append(None)
+                continue
+            local_status['pending'] += 1
+        future = local_executor.submit(process_article, article)
+        future.add_done_callback(release_local_slot)
+        futures.append(future)
+    wait([future for future in futures if future is not None], timeout=max(deadline - time.monotonic(), 0))
+    outcomes = []
+    for future in futures:
+        if future is None:
+            outcomes.append(('busy', "Too many articles already being processed, try again later"))
+        elif not future.done():
+            # A running article can't be cancelled; it keeps its thread (and backlog slot) until it finishes
+            if future.cancel():
+                outcomes.append(('timeout', "Timed out waiting for a free worker thread"))
+            else:
+                outcomes.append(('timeout', "Timed out processing article (still running)"))
+        elif future.exception() is not None:
+            outcomes.append(('error', str(future.exception())))
+        else:
+            outcomes.append(('ok', future.result()))
+    return outcomes
+
+def article_from_entry(entry):
+    return {
+        'id': entry['id'],
+        'title': entry['title'],
+        'summary': entry['description'],  # Use description as summary
+        'content': entry['description'],  # Use description as content
+        'link': entry['link']
+    }
+
 def fetch_rss_feed():
     try:
-        feed = feedparser.parse("https://www.bangkokpost.com/rss/data/topstories.xml")
-        print(f"Fetched {len(feed.entries)} entries from RSS feed")  # Add this line
-        articles = []
-        for entry in feed.entries[:10]:  # Limit to 10 articles
-            articles.append({
-                'title': entry.title,
-                'summary': entry.description,  # Use description as summary
-                'content': entry.description,  # Use description as content
-                'link': entry.link
-            })
-        return articles
+        entries = feed_ingestor.refresh().stories()
+        return [article_from_entry(entry) for entry in entries[:10]]  # Limit to 10 articles
     except Exception as e:
         logger.error(f"Error fetching RSS feed: {str(e)}")
         return []
 
 def fetch_full_article_content(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    article_body = soup.find('div', class_='articl-content')  # Adjust this selector based on the website's structure
-    if article_body:
-        paragraphs = article_body.find_all('p')
-        content = ' '.join([p.text for p in paragraphs])
-        return content[:1000]  # Limit to first 1000 characters (adjust as needed)
-    return ""
+    content = article_fetcher.fetch(url)
+    return content[:1000]  # Limit to first 1000 characters (adjust as needed)
 
 @app.route('/api/daily-summary')
 def get_daily_summary():
     try:
-        daily_post, audio_filename, transcript = run_daily_automation()
-        print(f"Daily post: {daily_post[:100]}...")  # Print first 100 chars
-        print(f"Transcript: {transcript[:100]}...")  # Print first 100 chars
+        artifact = daily_summary_service.get()
+        logger.debug("Daily post: %.100s...", artifact['summary'])
         return jsonify({
-            "summary": daily_post,
-            "audio_filename": audio_filename,
-            "transcript": transcript
+            "summary": artifact['summary'],
+            "audio_filename": artifact['audio_filename'],
+            "transcript": artifact['transcript'],
+            "generated_at": artifact['generated_at'],
+            "fingerprint": artifact.get('fingerprint'),
+            "stale": artifact['stale']
         })
     except Exception as e:
         print(f"Error in get_daily_summary: {str(e)}")
@@ -123,8 +256,30 @@ def get_daily_summary():
         traceback.print_exc()  # This will print the full stack trace
         return jsonify({"error": str(e)}), 500
 
+# Stored episodes are named by their content hash, so they never change
+AUDIO_MAX_AGE = 365 * 24 * 3600
+
 @app.route('/audio/<filename>')
 def serve_audio(filename):
+    if not os.path.exists(os.path.join(AUDIO_DIR, filename)):
+        # Still being synthesized: stream what exists so far and follow the file as it grows
+        live, f = open_live_episode(filename)
+        if live is not None:
+            return Response(stream_live_episode(live, f), mimetype='audio/mpeg', headers={'Cache-Control': 'no-store'})
+
+    audio_id, path = audio_store.resolve(filename)
+    if audio_id is not None:
+        if filename != f"{audio_id}.mp3":
+            # A name handed out while the episode was still being written
+            return redirect(url_for('serve_audio', filename=f"{audio_id}.mp3"))
+        # conditional=True answers If-None-Match with 304 and serves Range requests from the file
+        response = send_file(path, mimetype='audio/mpeg', conditional=True, etag=audio_id, max_age=AUDIO_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    # Only finished legacy episodes; not the manifest, lock or in-progress .part files
+    if not filename.endswith('.mp3'):
+        return jsonify({"error": "Not found"}), 404
     return send_from_directory(AUDIO_DIR, filename)
 
 if __name__ == "__main__":
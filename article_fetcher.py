@@ -0,0 +1,149 @@
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from translation_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# lxml is much faster than the pure-Python html.parser; use it when it's installed
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+ARTICLE_CACHE_DIR = os.environ.get('ARTICLE_CACHE_DIR', os.path.join(CACHE_DIR, 'articles'))
+
+FETCH_MAX_WORKERS = int(os.environ.get('ARTICLE_FETCH_WORKERS', 8))
+FETCH_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+MEMORY_MAX_ENTRIES = 512
+
+# Only the div.articl-content subtree of a Bangkok Post article page is ever built into a tree
+ARTICLE_BODY_TAG = 'div'
+ARTICLE_BODY_CLASS = 'articl-content'
+
+USER_AGENT = 'slownewsinthai/1.0'
+
+
+def has_body_class(value):
+    # While parsing, the strainer sees the raw class attribute; match it as a list of tokens like find() does
+    if not value:
+        return False
+    return ARTICLE_BODY_CLASS in (value.split() if isinstance(value, str) else value)
+
+
+def extract_body(html):
+    from bs4 import BeautifulSoup, SoupStrainer
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer(ARTICLE_BODY_TAG, class_=has_body_class))
+    return ' '.join(p.get_text(' ', strip=True) for p in soup.find_all('p'))
+
+
+class ArticleFetcher:
+    def __init__(self, cache_dir=ARTICLE_CACHE_DIR, max_workers=FETCH_MAX_WORKERS, timeout=FETCH_TIMEOUT):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._session = None
+        self._executor = None
+
+        self.fetches = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def session(self):
+        # One keep-alive connection pool shared by all fetch threads
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers, max_retries=retry)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['User-Agent'] = USER_AGENT
+                self._session = session
+            return self._session
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='article-fetch')
+            return self._executor
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json")
+
+    def _cached(self, url):
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+                return entry
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(url, entry)
+        return entry
+
+    def _remember(self, url, entry):
+        with self._lock:
+            self._memory[url] = entry
+            self._memory.move_to_end(url)
+            while len(self._memory) > MEMORY_MAX_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _store(self, url, entry):
+        self._remember(url, entry)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(url)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache article body for {url}: {str(e)}")
+
+    def fetch(self, url):
+        cached = self._cached(url)
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        try:
+            response = self.session().get(url, headers=headers, timeout=self.timeout)
+            self.fetches += 1
+            if response.status_code == 304 and cached is not None:
+                self.not_modified += 1
+                return cached['body']
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.errors += 1
+            logger.warning(f"Error fetching article {url}: {str(e)}")
+            return cached['body'] if cached is not None else ""
+
+        body = extract_body(response.content)
+        self._store(url, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'body': body,
+        })
+        return body
+
+    def fetch_many(self, urls):
+        # Bodies come back in the same order as urls; failures come back as ""
+        unique = list(dict.fromkeys(urls))
+        bodies = dict(zip(unique, self.executor().map(self.fetch, unique)))
+        return [bodies[url] for url in urls]
+
+
+article_fetcher = ArticleFetcher()
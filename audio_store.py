@@ -0,0 +1,161 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Keep episodes for this many days, and at most this many per day (newest win)
+AUDIO_RETENTION_DAYS = int(os.environ.get('AUDIO_RETENTION_DAYS', 14))
+AUDIO_EPISODES_PER_DAY = int(os.environ.get('AUDIO_EPISODES_PER_DAY', 3))
+
+# Names the in-progress file had before it was stored, kept so late requests can be redirected
+MAX_ALIASES = 200
+
+BLOB_NAME = re.compile(r'^([0-9a-f]{32})(?:\.mp3)?$')
+
+
+def file_digest(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+class AudioStore:
+    def __init__(self, directory, retention_days=AUDIO_RETENTION_DAYS, episodes_per_day=AUDIO_EPISODES_PER_DAY):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.lock_path = os.path.join(directory, '.manifest.lock')
+        self.retention_days = retention_days
+        self.episodes_per_day = episodes_per_day
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_stamp = None
+
+    def blob_path(self, audio_id):
+        return os.path.join(self.directory, f"{audio_id}.mp3")
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _load(self):
+        # The web app and run_automation.py share the manifest, so re-read it whenever it changed on disk
+        stamp = self._stamp()
+        if self._manifest is None or stamp != self._manifest_stamp:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            except FileNotFoundError:
+                self._manifest = {'episodes': {}, 'aliases': {}}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read audio manifest, starting a new one: {str(e)}")
+                self._manifest = {'episodes': {}, 'aliases': {}}
+            self._manifest_stamp = stamp
+        return self._manifest
+
+    @contextmanager
+    def _exclusive(self):
+        # Serializes manifest updates and blob GC across threads and processes sharing the directory
+        with self._lock:
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield self._load()
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, separators=(',', ':'))
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_stamp = self._stamp()
+
+    def put(self, path, date, fingerprint=None):
+        # Move a finished episode into the store under the hash of its bytes
+        audio_id = file_digest(path)
+        blob = self.blob_path(audio_id)
+        with self._exclusive() as manifest:
+            # Moved in under the lock, so another process's GC can't see the blob before the manifest does
+            if os.path.exists(blob):
+                os.remove(path)
+            else:
+                os.replace(path, blob)
+
+            episodes = manifest['episodes'].setdefault(date, [])
+            episodes[:] = [episode for episode in episodes if episode['id'] != audio_id]
+            episodes.append({
+                'id': audio_id,
+                'size': os.path.getsize(blob),
+                'fingerprint': fingerprint,
+                'created_at': time.time(),
+            })
+            aliases = manifest['aliases']
+            aliases[os.path.basename(path)] = audio_id
+            while len(aliases) > MAX_ALIASES:
+                aliases.pop(next(iter(aliases)))
+            self._gc(manifest)
+            self._save()
+        return audio_id
+
+    def resolve(self, filename):
+        # Returns (audio_id, path) for a stored blob or a former in-progress name, else (None, None)
+        match = BLOB_NAME.match(filename)
+        with self._lock:
+            audio_id = match.group(1) if match else self._load()['aliases'].get(filename)
+        if audio_id is None or not os.path.exists(self.blob_path(audio_id)):
+            return None, None
+        return audio_id, self.blob_path(audio_id)
+
+    def episodes(self, date):
+        with self._lock:
+            return list(self._load()['episodes'].get(date, []))
+
+    def _gc(self, manifest):
+        dates = sorted(manifest['episodes'])
+        cutoff = time.strftime('%Y-%m-%d', time.localtime(time.time() - self.retention_days * 86400))
+        newest = dates[-1] if dates else None
+        for date in dates:
+            if date < cutoff and date != newest:
+                del manifest['episodes'][date]
+            else:
+                episodes = sorted(manifest['episodes'][date], key=lambda episode: episode['created_at'])
+                manifest['episodes'][date] = episodes[-self.episodes_per_day:]
+
+        live = {episode['id'] for episodes in manifest['episodes'].values() for episode in episodes}
+        manifest['aliases'] = {name: audio_id for name, audio_id in manifest['aliases'].items() if audio_id in live}
+        removed = 0
+        for name in os.listdir(self.directory):
+            match = BLOB_NAME.match(name)
+            if match and name.endswith('.mp3') and match.group(1) not in live:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        if removed:
+            logger.info(f"Audio store removed {removed} unreferenced episode(s)")
+
+    def clear(self):
+        # Forget every episode and remove its audio
+        with self._exclusive() as manifest:
+            manifest['episodes'] = {}
+            manifest['aliases'] = {}
+            self._gc(manifest)
+            self._save()
+
+    def gc(self):
+        with self._exclusive() as manifest:
+            self._gc(manifest)
+            self._save()
@@ -1,117 +1,205 @@
 import os
-import feedparser
+import logging
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from celery_worker import translate_text
-from google.cloud import texttospeech
-from pydub import AudioSegment
-import io
+from audio_store import AudioStore
+from clients import get_tts_client
+from feed_ingestor import feed_ingestor
+from metrics import (AUDIO_ASSEMBLY_SECONDS, AUDIO_EPISODE_BYTES, AUDIO_EXPORT_SECONDS, TTS_AUDIO_BYTES,
+                     TTS_CHUNK_SECONDS, TTS_CHUNKS, TTS_INPUT_BYTES)
+from mp3_audio import Mp3Writer
+from text_chunker import TTS_MAX_BYTES, chunk_text, pack_blocks
+from translation import translate_batch
+from tts_cache import segment_key, tts_cache
 import re
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
 
 # Define the audio directory path
-AUDIO_DIR = '/workspaces/slownewsinthai/audio_files'
+AUDIO_DIR = os.environ.get('AUDIO_DIR', '/workspaces/slownewsinthai/audio_files')
 
 # Ensure the directory exists
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
+# Finished episodes are stored by content hash under AUDIO_DIR
+audio_store = AudioStore(AUDIO_DIR)
+
+# TTS request fan-out and retry policy
+TTS_MAX_CONCURRENCY = int(os.environ.get('TTS_MAX_CONCURRENCY', 4))
+TTS_MAX_ATTEMPTS = int(os.environ.get('TTS_MAX_ATTEMPTS', 3))
+TTS_BACKOFF_SECONDS = float(os.environ.get('TTS_BACKOFF_SECONDS', 0.5))
+
+# Stories packed into one TTS request on average; an edited story re-synthesizes only its own request
+TTS_STORIES_PER_REQUEST = int(os.environ.get('TTS_STORIES_PER_REQUEST', 8))
+
+# Silence inserted between synthesized chunks when joining their MP3 frames
+TTS_CHUNK_PAUSE_SECONDS = float(os.environ.get('TTS_CHUNK_PAUSE_SECONDS', 0))
+
+class SynthesisError(Exception):
+    def __init__(self, failed_chunks, total_chunks):
+        self.failed_chunks = failed_chunks
+        self.total_chunks = total_chunks
+        details = ', '.join(f"chunk {i+1}: {error}" for i, error in failed_chunks)
+        super().__init__(f"{len(failed_chunks)} of {total_chunks} TTS chunks failed ({details})")
+
 def fetch_daily_articles():
-    feed = feedparser.parse("https://www.bangkokpost.com/rss/data/topstories.xml")
+    # Stories carried by several feeds come back once, so each is translated and synthesized once
+    entries = feed_ingestor.refresh().stories()
     bangkok_tz = ZoneInfo("Asia/Bangkok")
     today = datetime.now(bangkok_tz).date()
     
     daily_articles = []
-    for entry in feed.entries:
-        pub_date = datetime(*entry.published_parsed[:6]).replace(tzinfo=ZoneInfo("UTC")).astimezone(bangkok_tz).date()
+    for entry in entries:
+        if entry['published_ts'] is None:
+            continue
+        pub_date = datetime.fromtimestamp(entry['published_ts'], ZoneInfo("UTC")).astimezone(bangkok_tz).date()
         if pub_date == today:
             daily_articles.append({
-                'title': entry.title,
-                'content': entry.description,
-                'link': entry.link,
-                'pub_date': pub_date
+                'id': entry['id'],
+                'title': entry['title'],
+                'content': entry['description'],
+                'link': entry['link'],
+                'pub_date': pub_date,
+                'sources': list(dict.fromkeys([entry['source']] + [duplicate['source'] for duplicate in entry['duplicates']]))
             })
     
     return daily_articles
 
-def compile_daily_post():
-    articles = fetch_daily_articles()
+def compile_daily_post(articles=None):
+    if articles is None:
+        articles = fetch_daily_articles()
     compiled_post = f"บทสรุปข่าวประจำวันที่ {datetime.now(ZoneInfo('Asia/Bangkok')).strftime('%Y-%m-%d')}\n\n"
     
+    segments = []
     for article in articles:
-        thai_title = translate_text(article['title'])
-        thai_content = translate_text(article['content'])
+        segments.append(article['title'])
+        segments.append(article['content'])
+    translations = translate_batch(segments)
+
+    for i, article in enumerate(articles):
+        thai_title = translations[2 * i]
+        thai_content = translations[2 * i + 1]
         
         compiled_post += f"• {thai_title}\n"
         compiled_post += f"  - {thai_content}\n\n"
         compiled_post += f"English: {article['title']}\n"
-        compiled_post += f"English: {article['content']}\n\n"
+        compiled_post += f"English: {article['content']}\n"
+        if len(article.get('sources', [])) > 1:
+            # Credit every outlet carrying the story; English lines aren't read out
+            compiled_post += f"English: Reported by {', '.join(article['sources'])}\n"
+        compiled_post += "\n"
     
     return compiled_post
 
-def text_to_speech(text, output_file):
-    print("Original text sent to text_to_speech:")
-    print(text)
-    print("=" * 50)
-
-    client = texttospeech.TextToSpeechClient()
-    voice = texttospeech.VoiceSelectionParams(
-        language_code="th-TH",
-        name="th-TH-Neural2-C"
-    )
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3,
-        speaking_rate=0.8
-    )
+def text_to_speech(text, output_file, on_started=None):
+    logger.debug("Original text sent to text_to_speech:\n%s", text)
+
+    client = None
+    language_code = "th-TH"
+    voice_name = "th-TH-Neural2-C"
+    speaking_rate = 0.8
 
     # Remove all English content
     thai_only_text = re.sub(r'\(English:.*?\)\n?|English:.*?(?=\n|$)', '', text, flags=re.DOTALL)
     thai_only_text = '\n'.join([line for line in thai_only_text.split('\n') if not line.strip().startswith('English:')])
 
-    print("Thai-only text after filtering:")
-    print(thai_only_text)
-    print("=" * 50)
+    logger.debug("Thai-only text after filtering:\n%s", thai_only_text)
+
+    # Pack stories into requests near the byte limit, grouped so unchanged stories keep hitting the audio cache
+    blocks = [block.strip() for block in re.split(r'\n\s*\n', thai_only_text) if block.strip()]
+    chunks = [chunk for chunk in pack_blocks(blocks, TTS_MAX_BYTES, TTS_STORIES_PER_REQUEST) if chunk]
 
-    # Split text into smaller chunks
-    chunks = split_text(thai_only_text)
+    keys = [segment_key(chunk, voice_name, language_code, speaking_rate, 'MP3') for chunk in chunks]
+    cached = [tts_cache.get(key) for key in keys]
+    missing = sum(1 for audio in cached if audio is None)
+    logger.info("%d of %d chunks served from the audio cache", len(chunks) - missing, len(chunks))
+    if missing:
+        # Only load the TTS library (and reuse the process-wide client) when something needs synthesizing
+        from google.cloud import texttospeech
+        client = get_tts_client()
+        voice = texttospeech.VoiceSelectionParams(
+            language_code=language_code,
+            name=voice_name
+        )
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MP3,
+            speaking_rate=speaking_rate
+        )
 
-    combined_audio = AudioSegment.empty()
-    for i, chunk in enumerate(chunks):
-        print(f"Processing chunk {i+1} of {len(chunks)}:")
-        print(chunk)
-        print("-" * 30)
+    def synthesize_chunk(i, chunk):
+        if cached[i] is not None:
+            TTS_CHUNKS.labels('cached').inc()
+            return cached[i]
+        logger.debug("Processing chunk %d of %d:\n%s", i + 1, len(chunks), chunk)
         synthesis_input = texttospeech.SynthesisInput(text=chunk)
-        try:
-            response = client.synthesize_speech(
-                input=synthesis_input, voice=voice, audio_config=audio_config
-            )
-            chunk_audio = AudioSegment.from_mp3(io.BytesIO(response.audio_content))
-            combined_audio += chunk_audio
-        except Exception as e:
-            print(f"Error processing chunk {i+1}: {e}")
-
-    combined_audio.export(output_file, format="mp3")
+        input_bytes = len(chunk.encode('utf-8'))
+        for attempt in range(TTS_MAX_ATTEMPTS):
+            try:
+                TTS_INPUT_BYTES.inc(input_bytes)
+                with TTS_CHUNK_SECONDS.time():
+                    response = client.synthesize_speech(
+                        input=synthesis_input, voice=voice, audio_config=audio_config
+                    )
+                TTS_CHUNKS.labels('ok').inc()
+                TTS_AUDIO_BYTES.inc(len(response.audio_content))
+                tts_cache.put(keys[i], response.audio_content)
+                return response.audio_content
+            except Exception as e:
+                if attempt + 1 == TTS_MAX_ATTEMPTS:
+                    TTS_CHUNKS.labels('failed').inc()
+                    raise
+                TTS_CHUNKS.labels('retry').inc()
+                delay = TTS_BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random())
+                logger.warning("Error processing chunk %d (attempt %d), retrying in %.1fs: %s", i + 1, attempt + 1, delay, e)
+                time.sleep(delay)
+
+    # Synthesize chunks in parallel, appending each one's MP3 frames to the file
+    # as soon as every chunk before it is done so /audio can stream the episode
+    assembly_started = time.perf_counter()
+    writer = Mp3Writer(output_file, pause_seconds=TTS_CHUNK_PAUSE_SECONDS)
+    failed_chunks = []
+    try:
+        with ThreadPoolExecutor(max_workers=TTS_MAX_CONCURRENCY) as executor:
+            futures = [executor.submit(synthesize_chunk, i, chunk) for i, chunk in enumerate(chunks)]
+            for i, future in enumerate(futures):
+                try:
+                    audio_content = future.result()
+                except Exception as e:
+                    logger.error("Error processing chunk %d: %s", i + 1, e)
+                    failed_chunks.append((i, e))
+                    continue
+                if not failed_chunks:
+                    with AUDIO_EXPORT_SECONDS.time():
+                        writer.add_segment(audio_content)
+                    # Only hand out the episode's name once there is audio behind it
+                    if i == 0 and on_started:
+                        on_started()
+    except BaseException:
+        writer.abort()
+        raise
+
+    if failed_chunks:
+        # Don't ship an episode with silent gaps where stories should be
+        writer.abort()
+        raise SynthesisError(failed_chunks, len(chunks))
+
+    writer.close()
+    AUDIO_ASSEMBLY_SECONDS.observe(time.perf_counter() - assembly_started)
+    AUDIO_EPISODE_BYTES.inc(writer.live.size)
     print(f"Audio content written to file {output_file}")
     print(f"Total characters processed: {len(thai_only_text)}")
 
-def split_text(text, max_chars=1000):
-    chunks = []
-    current_chunk = ""
-    for line in text.split('\n'):
-        words = line.split()
-        for word in words:
-            if len(current_chunk) + len(word) + 1 > max_chars:
-                chunks.append(current_chunk.strip())
-                current_chunk = word + " "
-            else:
-                current_chunk += word + " "
-        current_chunk += "\n"
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
-
-def run_daily_automation():
+def split_text(text, max_bytes=TTS_MAX_BYTES):
+    return chunk_text(text, max_bytes)
+
+def run_daily_automation(articles=None, on_audio_started=None, fingerprint=None):
+    daily_post = ""
     try:
         print("Starting daily automation...")
-        daily_post = compile_daily_post()
+        daily_post = compile_daily_post(articles)
         print(f"Daily post compiled: {daily_post[:100]}...")  # Print first 100 chars
         
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -119,11 +207,14 @@ def run_daily_automation():
         audio_file_path = os.path.join(AUDIO_DIR, audio_filename)
         
         print(f"Generating audio file: {audio_file_path}")
-        text_to_speech(daily_post, audio_file_path)
+        text_to_speech(daily_post, audio_file_path,
+                       on_started=on_audio_started and (lambda: on_audio_started(daily_post, audio_filename)))
         
         if os.path.exists(audio_file_path) and os.path.getsize(audio_file_path) > 0:
-            print("Audio file generated successfully")
-            return daily_post, audio_filename, daily_post
+            audio_id = audio_store.put(audio_file_path, datetime.now(ZoneInfo('Asia/Bangkok')).strftime('%Y-%m-%d'),
+                                       fingerprint=fingerprint)
+            print(f"Audio file generated successfully: {audio_id}")
+            return daily_post, f"{audio_id}.mp3", daily_post
         else:
             print("Audio file generation failed or file is empty")
             return daily_post, None, daily_post
@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+from mp3_audio import parse_frame_header, silence_frame
+
+# What Google TTS returns for th-TH: MPEG-2 Layer III, 24 kHz, 32 kbps, mono
+TTS_FRAME = silence_frame(parse_frame_header(bytes([0xFF, 0xF3, 0x44, 0xC4])))
+
+# Roughly how much speech one character of Thai turns into at speaking_rate 0.8
+FRAMES_PER_CHAR = 0.5
+
+WORDS = ("government economy tourism baht police court minister flood election "
+         "Bangkok province temple festival market energy rice export").split()
+
+
+class FakeAPIError(Exception):
+    pass
+
+
+class CallStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.units = 0
+
+    def record(self, units, error=False):
+        with self._lock:
+            self.calls += 1
+            self.units += units
+            if error:
+                self.errors += 1
+
+    def reset(self):
+        with self._lock:
+            self.calls = self.errors = self.units = 0
+
+
+class FakeTranslateClient:
+    def __init__(self, latency=0.05, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = CallStats()
+
+    def translate(self, values, target_language='th', source_language=None):
+        single = isinstance(values, str)
+        batch = [values] if single else list(values)
+        time.sleep(self.latency)
+        failed = self.random.random() < self.error_rate
+        self.stats.record(sum(len(text) for text in batch), error=failed)
+        if failed:
+            raise FakeAPIError("translate: injected failure")
+        results = [{'translatedText': f"[{target_language}] {text}", 'input': text} for text in batch]
+        return results[0] if single else results
+
+
+class FakeSynthesisResponse:
+    def __init__(self, audio_content):
+        self.audio_content = audio_content
+
+
+class FakeTextToSpeechClient:
+    def __init__(self, latency=0.2, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = CallStats()
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, **kwargs):
+        text = input.text
+        time.sleep(self.latency)
+        failed = self.random.random() < self.error_rate
+        self.stats.record(len(text.encode('utf-8')), error=failed)
+        if failed:
+            raise FakeAPIError("synthesize_speech: injected failure")
+        return FakeSynthesisResponse(TTS_FRAME * max(1, int(len(text) * FRAMES_PER_CHAR)))
+
+
+def fixture_rss(entries, seed=0, outlet='fixture'):
+    # Every outlet carries the same stories under its own GUIDs and links, like a syndicated wire story
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    items = []
+    for i in range(entries):
+        title = ' '.join(rng.choice(WORDS) for _ in range(8)).capitalize()
+        description = '. '.join(' '.join(rng.choice(WORDS) for _ in range(14)).capitalize() for _ in range(3)) + '.'
+        published = format_datetime(now - timedelta(minutes=i))
+        items.append(
+            f"<item><title>{escape(title)} #{i}</title><description>{escape(description)}</description>"
+            f"<link>https://{outlet}.local/news/{i}</link><guid>{outlet}-{i}</guid><pubDate>{published}</pubDate></item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Fixture top stories</title>'
+        + ''.join(items) + '</channel></rss>'
+    ).encode('utf-8')
+
+
+class FixtureRSSServer:
+    def __init__(self, entries=10, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self._feeds = {}
+        self.set_entries(entries)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.latency)
+                server.requests += 1
+                body, etag = server.feed(self.path.rsplit('/', 1)[-1].split('.')[0])
+                if self.headers.get('If-None-Match') == etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/rss+xml')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def set_entries(self, entries):
+        self.entries = entries
+        self._feeds = {}
+
+    def feed(self, name):
+        if name not in self._feeds:
+            body = fixture_rss(self.entries, outlet='fixture' if name == 'topstories' else name)
+            self._feeds[name] = (body, f'"{name}-{self.entries}-{len(body)}"')
+        return self._feeds[name]
+
+    def feed_url(self, name):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/rss/{name}.xml"
+
+    @property
+    def url(self):
+        return self.feed_url('topstories')
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
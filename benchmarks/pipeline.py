@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Everything the pipeline writes goes to a throwaway directory; set before importing it
+WORK_DIR = tempfile.mkdtemp(prefix='slownews-bench-')
+os.environ['SLOWNEWS_CACHE_DIR'] = os.path.join(WORK_DIR, 'cache')
+os.environ['AUDIO_DIR'] = os.path.join(WORK_DIR, 'audio')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import automation  # noqa: E402
+import daily_summary  # noqa: E402
+import clients  # noqa: E402
+from benchmarks.fakes import FakeTextToSpeechClient, FakeTranslateClient, FixtureRSSServer  # noqa: E402
+from feed_ingestor import feed_ingestor  # noqa: E402
+from feed_snapshot import FeedSnapshot, bangkok_post_feed  # noqa: E402
+from translation_cache import translation_cache  # noqa: E402
+from tts_cache import tts_cache  # noqa: E402
+
+STAGES = ['compile_daily_post', 'text_to_speech', '/process', '/api/daily-summary']
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def clear_caches():
+    translation_cache.clear()
+    tts_cache.clear()
+    for name in os.listdir(daily_summary.ARTIFACT_DIR):
+        os.remove(os.path.join(daily_summary.ARTIFACT_DIR, name))
+    automation.audio_store.clear()
+    for name in os.listdir(automation.AUDIO_DIR):
+        # Leftover episodes from text_to_speech runs that never went into the store
+        if name.endswith('.mp3'):
+            os.remove(os.path.join(automation.AUDIO_DIR, name))
+
+
+class Pipeline:
+    def __init__(self, translate_client, tts_client):
+        self.translate_client = translate_client
+        self.tts_client = tts_client
+        self.client = app.app.test_client()
+        self.post = None
+
+    def prepare(self, stage, warm):
+        if stage == '/api/daily-summary' and not warm:
+            app.daily_summary_service = daily_summary.DailySummaryService()
+
+    def run(self, stage):
+        if stage == 'compile_daily_post':
+            automation.compile_daily_post()
+        elif stage == 'text_to_speech':
+            automation.text_to_speech(self.post, os.path.join(automation.AUDIO_DIR, 'bench.mp3'))
+        elif stage == '/process':
+            ids = [entry['id'] for entry in feed_ingestor.refresh().stories()]
+            response = self.client.post('/process', json={'articles': ids})
+            if response.status_code != 200:
+                raise RuntimeError(f"/process returned {response.status_code}")
+        elif stage == '/api/daily-summary':
+            response = self.client.get('/api/daily-summary')
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/daily-summary returned {response.status_code}")
+
+    def settle(self, stage):
+        # The daily summary may answer before its episode is finished; let the build end before the next run
+        if stage == '/api/daily-summary':
+            app.daily_summary_service._executor.submit(lambda: None).result()
+
+    def measure(self, stage, repeats, warm, rss):
+        if stage == 'text_to_speech' and self.post is None:
+            self.post = automation.compile_daily_post()
+        if warm:
+            # Untimed run to fill the caches (and, for the daily summary, build the artifact)
+            self.prepare(stage, warm=False)
+            self.run(stage)
+            self.settle(stage)
+
+        samples = []
+        failures = 0
+        self.translate_client.stats.reset()
+        self.tts_client.stats.reset()
+        rss_requests = rss.requests
+        for _ in range(repeats):
+            if not warm:
+                clear_caches()
+            self.prepare(stage, warm)
+            start = time.perf_counter()
+            try:
+                self.run(stage)
+            except Exception as e:
+                failures += 1
+                print(f"{stage} failed: {e}", file=sys.stderr)
+            samples.append(time.perf_counter() - start)
+            self.settle(stage)
+
+        # One more run under tracemalloc for peak memory, kept out of the latency samples
+        if not warm:
+            clear_caches()
+        self.prepare(stage, warm)
+        tracemalloc.start()
+        try:
+            self.run(stage)
+        except Exception:
+            pass
+        self.settle(stage)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p90_ms': percentile(samples, 90) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+            'translate_calls': self.translate_client.stats.calls / (repeats + 1),
+            'translate_chars': self.translate_client.stats.units / (repeats + 1),
+            'tts_calls': self.tts_client.stats.calls / (repeats + 1),
+            'tts_bytes': self.tts_client.stats.units / (repeats + 1),
+            'rss_requests': (rss.requests - rss_requests) / (repeats + 1),
+            'peak_mb': peak / (1024 * 1024),
+            'failures': failures,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark against local fakes")
+    parser.add_argument('--sizes', default='10,50,100,500', help="comma-separated feed sizes")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stages to run")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warm', action='store_true', help="also measure with warm caches")
+    parser.add_argument('--feeds', type=int, default=1, help="outlets carrying the same stories")
+    parser.add_argument('--rss-latency', type=float, default=0.02)
+    parser.add_argument('--translate-latency', type=float, default=0.05)
+    parser.add_argument('--translate-error-rate', type=float, default=0.0)
+    parser.add_argument('--tts-latency', type=float, default=0.2)
+    parser.add_argument('--tts-error-rate', type=float, default=0.0)
+    parser.add_argument('--json', help="write results to this file as JSON")
+    args = parser.parse_args()
+
+    translate_client = FakeTranslateClient(args.translate_latency, args.translate_error_rate)
+    tts_client = FakeTextToSpeechClient(args.tts_latency, args.tts_error_rate)
+    clients.set_client('translate', translate_client)
+    clients.set_client('tts', tts_client)
+    app.CELERY_AVAILABLE = False
+    app.PROCESS_DEADLINE_SECONDS = 600
+    daily_summary.FEED_CHECK_INTERVAL = 0
+    bangkok_post_feed.refresh_interval = 0
+    feed_ingestor.host_interval = 0
+
+    results = []
+    try:
+        with FixtureRSSServer(latency=args.rss_latency) as rss:
+            bangkok_post_feed.url = rss.url
+            feed_ingestor.snapshots = [bangkok_post_feed] + [
+                FeedSnapshot(rss.feed_url(f"outlet{i}"), refresh_interval=0) for i in range(1, args.feeds)
+            ]
+            pipeline = Pipeline(translate_client, tts_client)
+            for size in [int(size) for size in args.sizes.split(',')]:
+                rss.set_entries(size)
+                pipeline.post = None
+                for stage in args.stages.split(','):
+                    for warm in ([False, True] if args.warm else [False]):
+                        row = {'stage': stage, 'entries': size, 'caches': 'warm' if warm else 'cold'}
+                        row.update(pipeline.measure(stage, args.repeats, warm, rss))
+                        results.append(row)
+                        print(
+                            f"{stage:<20} {size:>4} {row['caches']:<4}  "
+                            f"p50 {row['p50_ms']:8.1f}ms  p90 {row['p90_ms']:8.1f}ms  p99 {row['p99_ms']:8.1f}ms  "
+                            f"translate {row['translate_calls']:6.1f}  tts {row['tts_calls']:6.1f}  "
+                            f"rss {row['rss_requests']:4.1f}  peak {row['peak_mb']:7.1f}MB  failures {row['failures']}",
+                            flush=True
+                        )
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
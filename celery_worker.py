@@ -1,9 +1,10 @@
 from celery import Celery
-import time
-from google.cloud import translate_v2 as translate
+from celery.signals import worker_process_shutdown
 import os
 from dotenv import load_dotenv
 import logging
+import translation
+from metrics import mark_process_dead
 
 # Load environment variables
 load_dotenv()
@@ -22,44 +23,16 @@ celery.conf.update(
 )
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
-translate_client = translate.Client()
+# The task bodies live in translation.py so the web app can call them without importing Celery
+translate_text = celery.task(name='celery_worker.translate_text')(translation.translate_text)
+translate_batch = celery.task(name='celery_worker.translate_batch')(translation.translate_batch)
+process_article = celery.task(name='celery_worker.process_article')(translation.process_article)
 
-@celery.task
-def translate_text(text, target_lang='th'):
-    try:
-        result = translate_client.translate(text, target_language=target_lang)
-        return result['translatedText']
-    except Exception as e:
-        print(f"Translation error: {str(e)}")
-        return text  # Return original text if translation fails
 
-@celery.task
-def process_article(article):
-    try:
-        title = article['title']
-        content = article.get('content') or article.get('summary', '')
-
-        if not content.strip():
-            content = "No content available for this article."
-
-        print(f"Translating title: {title}")  # Debug print
-        translated_title = translate_text(title)
-        print(f"Translated title: {translated_title}")  # Debug print
-
-        print(f"Translating content: {content[:100]}...")  # Debug print
-        translated_content = translate_text(content)
-        print(f"Translated content: {translated_content[:100]}...")  # Debug print
-
-        return {
-            'original_title': title,
-            'original_content': content,
-            'translated_title': translated_title,
-            'translated_content': translated_content,
-            'link': article['link']
-        }
-    except Exception as e:
-        print(f"Error in process_article: {str(e)}")  # Debug print
-        raise
\ No newline at end of file
+@worker_process_shutdown.connect
+def cleanup_metrics(pid=None, **kwargs):
+    # Drop a finished child's live gauges from the shared PROMETHEUS_MULTIPROC_DIR
+    mark_process_dead(pid or os.getpid())
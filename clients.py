@@ -0,0 +1,64 @@
+import os
+import threading
+
+# Provider clients are built on first use and then shared by every caller in the process.
+# Their gRPC/HTTP channels must not cross a fork, so a forked child (e.g. a Celery
+# prefork worker) starts with an empty registry and builds its own.
+
+_clients = {}
+_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def _build_translate_client():
+    from google.cloud import translate_v2 as translate
+    return translate.Client()
+
+
+def _build_tts_client():
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechClient()
+
+
+FACTORIES = {
+    'translate': _build_translate_client,
+    'tts': _build_tts_client,
+}
+
+
+def _reset_after_fork():
+    global _lock, _pid
+    _clients.clear()
+    _lock = threading.Lock()
+    _pid = os.getpid()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client(name):
+    client = _clients.get(name)
+    if client is not None and _pid == os.getpid():
+        return client
+    with _lock:
+        if _pid != os.getpid():
+            _reset_after_fork()
+        client = _clients.get(name)
+        if client is None:
+            client = FACTORIES[name]()
+            _clients[name] = client
+        return client
+
+
+def set_client(name, client):
+    # Swap in a preconfigured client (or a fake) for this process
+    with _lock:
+        _clients[name] = client
+
+
+def get_translate_client():
+    return get_client('translate')
+
+
+def get_tts_client():
+    return get_client('tts')
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from automation import fetch_daily_articles, run_daily_automation
+from translation_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Built daily artifacts (post text, transcript, audio filename) are stored here as JSON
+ARTIFACT_DIR = os.environ.get('DAILY_ARTIFACT_DIR', os.path.join(CACHE_DIR, 'daily'))
+
+# Don't look at the feed more often than this, however many browsers are polling
+FEED_CHECK_INTERVAL = int(os.environ.get('DAILY_FEED_CHECK_INTERVAL', 60))
+
+# A feed whose build failed isn't retried before this, doubling per failure up to the cap
+BUILD_RETRY_SECONDS = int(os.environ.get('DAILY_BUILD_RETRY_SECONDS', 300))
+BUILD_RETRY_MAX_SECONDS = int(os.environ.get('DAILY_BUILD_RETRY_MAX_SECONDS', 3600))
+
+os.makedirs(ARTIFACT_DIR, exist_ok=True)
+
+
+def today():
+    return datetime.now(ZoneInfo('Asia/Bangkok')).strftime('%Y-%m-%d')
+
+
+def feed_fingerprint(date, articles):
+    digest = hashlib.sha256(date.encode('utf-8'))
+    for article in articles:
+        for field in ('link', 'title', 'content'):
+            digest.update(b'\x00')
+            digest.update((article.get(field) or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def artifact_path(date):
+    return os.path.join(ARTIFACT_DIR, f"daily_summary_{date}.json")
+
+
+def load_artifact(date):
+    try:
+        with open(artifact_path(date), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read daily artifact for {date}: {str(e)}")
+        return None
+
+
+def load_latest_artifact():
+    names = sorted(name for name in os.listdir(ARTIFACT_DIR) if name.startswith('daily_summary_') and name.endswith('.json'))
+    if not names:
+        return None
+    return load_artifact(names[-1][len('daily_summary_'):-len('.json')])
+
+
+def save_artifact(artifact):
+    path = artifact_path(artifact['date'])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(artifact, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class DailySummaryService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='daily-summary')
+        self._inflight = {}
+        self._started = {}
+        self._last_good = None
+        self._checked_at = 0.0
+        self._checked_fingerprint = None
+        self._checked_articles = None
+        self._failed = {}
+
+    def _current_feed(self, date):
+        # Polls arriving within FEED_CHECK_INTERVAL reuse the last fingerprint
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_fingerprint and self._checked_fingerprint[0] == date and now - self._checked_at < FEED_CHECK_INTERVAL:
+                return self._checked_fingerprint[1], self._checked_articles
+        articles = fetch_daily_articles()
+        fingerprint = feed_fingerprint(date, articles)
+        with self._lock:
+            self._checked_at = now
+            self._checked_fingerprint = (date, fingerprint)
+            self._checked_articles = articles
+        return fingerprint, articles
+
+    def _record_failure(self, fingerprint, artifact):
+        with self._lock:
+            failures = self._failed[fingerprint][1] + 1 if fingerprint in self._failed else 1
+            delay = min(BUILD_RETRY_SECONDS * 2 ** (failures - 1), BUILD_RETRY_MAX_SECONDS)
+            self._failed = {key: value for key, value in self._failed.items() if value[0] > time.monotonic()}
+            self._failed[fingerprint] = (time.monotonic() + delay, failures, artifact)
+        logger.warning(f"Daily build failed {failures} time(s); not retrying this feed for {delay}s")
+
+    def _build(self, date, fingerprint, articles):
+        artifact = None
+        succeeded = False
+        try:
+            with self._lock:
+                if self._last_good is not None and self._last_good['fingerprint'] == fingerprint:
+                    # Already built: that's a success, not a failure to back off from
+                    succeeded = True
+                    return self._last_good
+            def audio_started(daily_post, audio_filename):
+                # The episode can be streamed from /audio while it is still being synthesized
+                started = self._started.get(fingerprint)
+                if started is not None:
+                    started[1].update(date=date, fingerprint=fingerprint, summary=daily_post, transcript=daily_post,
+                                      audio_filename=audio_filename,
+                                      generated_at=datetime.now(ZoneInfo('Asia/Bangkok')).isoformat())
+                    started[0].set()
+
+            daily_post, audio_filename, transcript = run_daily_automation(articles, on_audio_started=audio_started,
+                                                                     fingerprint=fingerprint)
+            artifact = {
+                'date': date,
+                'fingerprint': fingerprint,
+                'summary': daily_post,
+                'transcript': transcript,
+                'audio_filename': audio_filename,
+                'generated_at': datetime.now(ZoneInfo('Asia/Bangkok')).isoformat(),
+            }
+            if audio_filename:
+                save_artifact(artifact)
+                with self._lock:
+                    self._last_good = artifact
+                    self._failed.pop(fingerprint, None)
+                succeeded = True
+            else:
+                logger.warning(f"Daily build for {date} produced no audio; keeping previous artifact")
+            return artifact
+        finally:
+            if not succeeded:
+                self._record_failure(fingerprint, artifact)
+            with self._lock:
+                self._inflight.pop(fingerprint, None)
+                started = self._started.pop(fingerprint, None)
+            if started is not None:
+                started[0].set()
+
+    def _rebuild(self, date, fingerprint, articles):
+        # Single-flight: every caller for the same fingerprint shares one job
+        with self._lock:
+            future = self._inflight.get(fingerprint)
+            failed = self._failed.get(fingerprint)
+            if future is None and failed is not None and failed[0] > time.monotonic():
+                # Recently failed: don't run the whole pipeline again until the backoff expires
+                return None, None
+            if future is None:
+                self._started[fingerprint] = started = (threading.Event(), {})
+                future = self._executor.submit(self._build, date, fingerprint, articles)
+                self._inflight[fingerprint] = future
+            else:
+                started = self._started.get(fingerprint)
+            return future, started
+
+    def get(self):
+        date = today()
+        with self._lock:
+            last_good = self._last_good
+        if last_good is None or last_good['date'] != date:
+            stored = load_artifact(date) or (load_latest_artifact() if last_good is None else None)
+            if stored is not None:
+                with self._lock:
+                    self._last_good = last_good = stored
+
+        fingerprint, articles = self._current_feed(date)
+        if last_good is not None and last_good['date'] == date and last_good['fingerprint'] == fingerprint:
+            return dict(last_good, stale=False)
+
+        future, started = self._rebuild(date, fingerprint, articles)
+        if last_good is not None:
+            # Serve the last good episode while the new one is being built
+            return dict(last_good, stale=True)
+        if future is None:
+            with self._lock:
+                failed = self._failed.get(fingerprint)
+            if failed is None or failed[2] is None:
+                raise RuntimeError("Daily summary build failed recently; waiting before retrying")
+            return dict(failed[2], stale=False)
+        # Nothing to fall back on: hand out the episode as soon as its audio starts streaming
+        if started is not None:
+            started[0].wait()
+            if not future.done() and started[1]:
+                return dict(started[1], stale=False)
+        # The build is over (or never started streaming): a failed one comes back without audio
+        return dict(future.result(), stale=False)
+
+
+daily_summary_service = DailySummaryService()
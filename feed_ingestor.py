@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+from feed_snapshot import BANGKOK_POST_TOP_STORIES, FEED_TIMEOUT, FeedSnapshot, bangkok_post_feed
+from metrics import FEED_INGEST_SECONDS, STORY_CLUSTER_SECONDS
+from story_index import StoryIndex
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated RSS/Atom feeds to build the digest from; earlier feeds win when outlets overlap
+FEED_URLS = [url.strip() for url in os.environ.get('FEED_URLS', BANGKOK_POST_TOP_STORIES).split(',') if url.strip()]
+
+# Feeds fetched at once, and the minimum gap between two requests to the same host
+FEED_MAX_CONCURRENCY = int(os.environ.get('FEED_MAX_CONCURRENCY', 8))
+FEED_HOST_INTERVAL = float(os.environ.get('FEED_HOST_INTERVAL', 1.0))
+
+# A feed still downloading after this long is given up on until its next refresh
+FEED_REQUEST_DEADLINE = float(os.environ.get('FEED_REQUEST_DEADLINE', 15))
+
+
+def feed_source(url):
+    host = urlsplit(url).hostname or url
+    return host[4:] if host.startswith('www.') else host
+
+
+def story_text(entry):
+    return f"{entry['title']}\n{entry['description']}"
+
+
+class FeedIngestor:
+    def __init__(self, snapshots, max_concurrency=FEED_MAX_CONCURRENCY, host_interval=FEED_HOST_INTERVAL,
+                 request_deadline=FEED_REQUEST_DEADLINE):
+        self.snapshots = snapshots
+        self.max_concurrency = max_concurrency
+        self.host_interval = host_interval
+        self.request_deadline = request_deadline
+        self.index = StoryIndex()
+        self._lock = threading.Lock()
+        self._host_next = {}
+        self._stories_key = None
+        self._stories = []
+
+    def _host_slot(self, host):
+        # Reserve the next free slot for this host; shared by every refresh, whichever thread runs it
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._host_next.get(host, 0.0))
+            self._host_next[host] = start + self.host_interval
+        return start - now
+
+    async def _refresh_one(self, client, snapshot, force):
+        if not snapshot.claim(force):
+            return
+        wait = self._host_slot(urlsplit(snapshot.url).netloc)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                client.get(snapshot.url, headers=snapshot.request_headers()), self.request_deadline
+            )
+        except Exception as e:
+            # Timed out or failed: the snapshot keeps its previous entries
+            snapshot.record_failure(str(e) or type(e).__name__, time.perf_counter() - started)
+            return
+        snapshot.apply_response(response.status_code, response.content, response.headers,
+                                time.perf_counter() - started)
+
+    async def _refresh_all(self, snapshots, force):
+        import httpx
+        limits = httpx.Limits(max_connections=self.max_concurrency)
+        timeout = httpx.Timeout(FEED_TIMEOUT[1], connect=FEED_TIMEOUT[0])
+        async with httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True) as client:
+            await asyncio.gather(*(self._refresh_one(client, snapshot, force) for snapshot in snapshots))
+
+    def refresh(self, force=False):
+        # No lock is held while fetching, so stories() and get() keep answering from the current snapshots
+        due = [snapshot for snapshot in self.snapshots if force or snapshot.due()]
+        if due:
+            with FEED_INGEST_SECONDS.time():
+                asyncio.run(self._refresh_all(due, force))
+        return self
+
+    def entries(self):
+        # Interleave feeds by position so each outlet's ranking is kept; a shared entry ID appears once
+        feeds = [[dict(entry, source=feed_source(snapshot.url)) for entry in snapshot.entries]
+                 for snapshot in self.snapshots]
+        merged = []
+        seen = set()
+        for position in range(max((len(entries) for entries in feeds), default=0)):
+            for entries in feeds:
+                if position < len(entries) and entries[position]['id'] not in seen:
+                    seen.add(entries[position]['id'])
+                    merged.append(entries[position])
+        return merged
+
+    def stories(self):
+        # One entry per story: near-duplicates from other outlets are folded into the first one as 'duplicates'
+        key = tuple((snapshot.url, snapshot.version) for snapshot in self.snapshots)
+        with self._lock:
+            if key == self._stories_key:
+                return self._stories
+        entries = self.entries()
+        with STORY_CLUSTER_SECONDS.time():
+            clusters = self.index.cluster([(entry['id'], story_text(entry)) for entry in entries])
+        stories = []
+        for cluster in clusters:
+            story = dict(entries[cluster[0]])
+            story['duplicates'] = [
+                {'id': entries[i]['id'], 'source': entries[i]['source'], 'link': entries[i]['link']}
+                for i in cluster[1:]
+            ]
+            stories.append(story)
+        if len(stories) < len(entries):
+            logger.info(f"Folded {len(entries) - len(stories)} duplicate entries into {len(stories)} stories")
+        with self._lock:
+            self._stories_key = key
+            self._stories = stories
+        return stories
+
+    def get(self, article_id):
+        for snapshot in self.snapshots:
+            entry = snapshot.get(article_id)
+            if entry is not None:
+                return dict(entry, source=feed_source(snapshot.url))
+        return None
+
+
+feed_ingestor = FeedIngestor([
+    bangkok_post_feed if url == BANGKOK_POST_TOP_STORIES else FeedSnapshot(url) for url in FEED_URLS
+])
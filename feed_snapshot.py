@@ -0,0 +1,187 @@
+import calendar
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import requests
+from metrics import FEED_FETCH_SECONDS, FEED_NORMALIZE_SECONDS
+from translation_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+BANGKOK_POST_TOP_STORIES = "https://www.bangkokpost.com/rss/data/topstories.xml"
+
+FEED_CACHE_DIR = os.environ.get('FEED_CACHE_DIR', os.path.join(CACHE_DIR, 'feeds'))
+
+# Callers within this window share the snapshot without touching the network
+FEED_REFRESH_INTERVAL = int(os.environ.get('FEED_REFRESH_INTERVAL', 60))
+
+# Articles that dropped out of the feed stay resolvable by ID for a while
+RETIRED_ENTRIES = 500
+
+FEED_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+USER_AGENT = 'slownewsinthai/1.0'
+
+
+def article_id(entry):
+    source = entry.get('id') or entry.get('link') or entry.get('title', '')
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+
+def normalize_entry(entry):
+    published = entry.get('published_parsed') or entry.get('updated_parsed')
+    return {
+        'id': article_id(entry),
+        'title': entry.get('title', ''),
+        'description': entry.get('description', ''),
+        'link': entry.get('link', ''),
+        'published_ts': calendar.timegm(published) if published else None,
+    }
+
+
+class FeedSnapshot:
+    def __init__(self, url, cache_dir=FEED_CACHE_DIR, refresh_interval=FEED_REFRESH_INTERVAL):
+        self.url = url
+        self.path = os.path.join(cache_dir, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.json")
+        self.refresh_interval = refresh_interval
+        # _lock guards the entries and is never held across network I/O; _update_lock orders updates
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._session = None
+        self._checked_at = 0.0
+        self._retired = OrderedDict()
+
+        self.version = 0
+        self.etag = None
+        self.modified = None
+        self.entries = []
+        self._by_id = {}
+
+        self.fetches = 0
+        self.not_modified = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read feed snapshot {self.path}: {str(e)}")
+            return
+        self.version = stored.get('version', 0)
+        self.etag = stored.get('etag')
+        self.modified = stored.get('modified')
+        self._set_entries(stored.get('entries', []))
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': self.url,
+                'version': self.version,
+                'etag': self.etag,
+                'modified': self.modified,
+                'entries': self.entries,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _set_entries(self, entries):
+        for old_id, old_entry in self._by_id.items():
+            self._retired[old_id] = old_entry
+            self._retired.move_to_end(old_id)
+        while len(self._retired) > RETIRED_ENTRIES:
+            self._retired.popitem(last=False)
+        self.entries = entries
+        self._by_id = {entry['id']: entry for entry in entries}
+
+    def due(self, now=None):
+        now = time.monotonic() if now is None else now
+        return not self.version or now - self._checked_at >= self.refresh_interval
+
+    def claim(self, force=False):
+        # Only the caller that claims a due snapshot fetches it; the others keep serving the current entries
+        with self._update_lock:
+            now = time.monotonic()
+            if not force and not self.due(now):
+                return False
+            self._checked_at = now
+            return True
+
+    def request_headers(self):
+        # Conditional GET: an unchanged feed comes back as a bodiless 304
+        headers = {'User-Agent': USER_AGENT}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.modified:
+            headers['If-Modified-Since'] = self.modified
+        return headers
+
+    def record_failure(self, error, elapsed):
+        # The previous entries stay in place
+        FEED_FETCH_SECONDS.labels('error').observe(elapsed)
+        logger.error(f"Error fetching RSS feed {self.url}: {str(error)}")
+
+    def apply_response(self, status, content, headers, elapsed):
+        self.fetches += 1
+        if status == 304:
+            FEED_FETCH_SECONDS.labels('not_modified').observe(elapsed)
+            self.not_modified += 1
+            return
+        if status != 200:
+            self.record_failure(f"HTTP {status}", elapsed)
+            return
+
+        import feedparser
+        feed = feedparser.parse(content, response_headers=dict(headers))
+        if not feed.entries:
+            FEED_FETCH_SECONDS.labels('error' if feed.get('bozo') else 'empty').observe(elapsed)
+            if feed.get('bozo'):
+                logger.error(f"Error parsing RSS feed {self.url}: {feed.get('bozo_exception')}")
+            return
+        FEED_FETCH_SECONDS.labels('ok').observe(elapsed)
+
+        with FEED_NORMALIZE_SECONDS.time():
+            entries = [normalize_entry(entry) for entry in feed.entries]
+        with self._update_lock:
+            self.etag = headers.get('ETag')
+            self.modified = headers.get('Last-Modified')
+            if entries != self.entries:
+                with self._lock:
+                    self.version += 1
+                    self._set_entries(entries)
+                logger.info("Fetched %d entries from RSS feed %s (version %d)", len(entries), self.url, self.version)
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"Could not save feed snapshot {self.path}: {str(e)}")
+
+    def session(self):
+        with self._update_lock:
+            if self._session is None:
+                self._session = requests.Session()
+            return self._session
+
+    def refresh(self, force=False):
+        if not self.claim(force):
+            return self
+        started = time.perf_counter()
+        try:
+            response = self.session().get(self.url, headers=self.request_headers(), timeout=FEED_TIMEOUT)
+        except requests.RequestException as e:
+            self.record_failure(e, time.perf_counter() - started)
+            return self
+        self.apply_response(response.status_code, response.content, response.headers, time.perf_counter() - started)
+        return self
+
+    def get(self, article_id):
+        with self._lock:
+            return self._by_id.get(article_id) or self._retired.get(article_id)
+
+
+bangkok_post_feed = FeedSnapshot(BANGKOK_POST_TOP_STORIES)
@@ -0,0 +1,103 @@
+import logging
+import os
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Set (to the same empty directory) for the web app and Celery workers, so /metrics
+# includes what worker processes recorded, e.g. Translate calls made by /process tasks
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+NETWORK_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LONG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Feed
+FEED_FETCH_SECONDS = Histogram(
+    'slownews_feed_fetch_seconds', "RSS conditional GET plus parse", ['status'], buckets=NETWORK_BUCKETS)
+FEED_NORMALIZE_SECONDS = Histogram(
+    'slownews_feed_normalize_seconds', "Turning parsed feed entries into articles", buckets=NETWORK_BUCKETS)
+FEED_INGEST_SECONDS = Histogram(
+    'slownews_feed_ingest_seconds', "Refreshing every configured feed concurrently", buckets=NETWORK_BUCKETS)
+STORY_CLUSTER_SECONDS = Histogram(
+    'slownews_story_cluster_seconds', "Grouping near-duplicate entries across feeds", buckets=NETWORK_BUCKETS)
+
+# Caches
+CACHE_LOOKUPS = Counter('slownews_cache_lookups', "Cache lookups by result", ['cache', 'result'])
+
+# Translation
+TRANSLATE_REQUEST_SECONDS = Histogram(
+    'slownews_translate_request_seconds', "Translate API request latency", buckets=NETWORK_BUCKETS)
+TRANSLATE_REQUESTS = Counter('slownews_translate_requests_total', "Translate API requests", ['result'])
+TRANSLATE_SEGMENTS = Counter('slownews_translate_segments_total', "Segments sent to the Translate API")
+TRANSLATE_CHARACTERS = Counter('slownews_translate_characters_total', "Characters sent to the Translate API")
+
+# Text-to-speech
+TTS_CHUNK_SECONDS = Histogram(
+    'slownews_tts_chunk_seconds', "TTS synthesize_speech latency per chunk", buckets=NETWORK_BUCKETS)
+TTS_CHUNKS = Counter('slownews_tts_chunks_total', "TTS chunks by outcome", ['result'])
+TTS_INPUT_BYTES = Counter('slownews_tts_input_bytes_total', "UTF-8 text bytes sent to the TTS API")
+TTS_AUDIO_BYTES = Counter('slownews_tts_audio_bytes_total', "MP3 bytes returned by the TTS API")
+
+# Audio assembly
+AUDIO_ASSEMBLY_SECONDS = Histogram(
+    'slownews_audio_assembly_seconds', "Synthesizing and writing a whole episode", buckets=LONG_BUCKETS)
+AUDIO_EXPORT_SECONDS = Histogram(
+    'slownews_audio_export_seconds', "Appending one segment's frames to the episode file", buckets=NETWORK_BUCKETS)
+AUDIO_EPISODE_BYTES = Counter('slownews_audio_episode_bytes_total', "Bytes of finished episode audio written")
+
+# HTTP
+HTTP_REQUEST_SECONDS = Histogram(
+    'slownews_http_request_seconds', "Flask request latency by route", ['route', 'method', 'status'],
+    buckets=NETWORK_BUCKETS + LONG_BUCKETS[7:])
+
+
+class PipelineCollector:
+    # Cache hit ratios and Celery queue depth are read at scrape time rather than pushed
+
+    def describe(self):
+        # Without this the registry would call collect() at import time, pulling in Celery
+        yield GaugeMetricFamily('slownews_cache_hit_ratio', "Cache hit ratio in this process", labels=['cache'])
+        yield GaugeMetricFamily('slownews_celery_queue_depth', "Messages waiting in the Celery queue", labels=['queue'])
+
+    def collect(self):
+        hit_ratio = GaugeMetricFamily('slownews_cache_hit_ratio', "Cache hit ratio in this process", labels=['cache'])
+        try:
+            from translation_cache import translation_cache
+            from tts_cache import tts_cache
+            hit_ratio.add_metric(['translation'], translation_cache.stats()['hit_ratio'])
+            hit_ratio.add_metric(['tts'], tts_cache.stats()['hit_ratio'])
+        except Exception as e:
+            logger.debug(f"Cache stats unavailable: {str(e)}")
+        yield hit_ratio
+
+        queue_depth = GaugeMetricFamily('slownews_celery_queue_depth', "Messages waiting in the Celery queue", labels=['queue'])
+        try:
+            from celery_worker import celery
+            with celery.connection_for_write() as conn:
+                conn.ensure_connection(max_retries=1, interval_start=0, timeout=1)
+                queue = celery.conf.task_default_queue
+                _, depth, _ = conn.default_channel.queue_declare(queue=queue, passive=True)
+                queue_depth.add_metric([queue], depth)
+        except Exception as e:
+            logger.debug(f"Celery queue depth unavailable: {str(e)}")
+        yield queue_depth
+
+
+pipeline_collector = PipelineCollector()
+REGISTRY.register(pipeline_collector)
+
+
+def render():
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    # Counters and histograms are summed over every process's files in the shared directory
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(pipeline_collector)
+    return generate_latest(registry)
+
+
+def mark_process_dead(pid):
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,232 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bitrates in kbps, indexed by [MPEG-1?][layer][bitrate index]
+BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+
+# Sample rates indexed by the header's version bits
+SAMPLE_RATES = {
+    0: [11025, 12000, 8000],   # MPEG-2.5
+    2: [22050, 24000, 16000],  # MPEG-2
+    3: [44100, 48000, 32000],  # MPEG-1
+}
+
+LAYERS = {1: 3, 2: 2, 3: 1}
+
+
+def parse_frame_header(data, offset=0):
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = (b1 >> 3) & 3
+    layer = LAYERS.get((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 3
+    if version == 1 or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    return {
+        'version': version,
+        'mpeg1': mpeg1,
+        'layer': layer,
+        'crc': not (b1 & 1),
+        'mono': (b3 >> 6) == 3,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'padding': padding,
+        'samples': samples,
+        'length': length,
+    }
+
+
+def strip_tags(data):
+    # ID3v2 at the front (size is a 28-bit syncsafe integer), ID3v1 at the back
+    start = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    return data[start:end]
+
+
+def is_info_frame(frame, header):
+    # Xing/Info/VBRI frames describe the stream they came from and are wrong once spliced
+    side_info = (17 if header['mono'] else 32) if header['mpeg1'] else (9 if header['mono'] else 17)
+    offset = 4 + (2 if header['crc'] else 0) + side_info
+    return frame[offset:offset + 4] in (b'Xing', b'Info') or frame[36:40] == b'VBRI'
+
+
+def iter_frames(data):
+    data = strip_tags(data)
+    offset = 0
+    first = True
+    while offset + 4 <= len(data):
+        header = parse_frame_header(data, offset)
+        if header is None or offset + header['length'] > len(data):
+            # Resync on the next frame sync word
+            next_sync = data.find(b'\xff', offset + 1)
+            if next_sync < 0:
+                break
+            offset = next_sync
+            continue
+        frame = data[offset:offset + header['length']]
+        offset += header['length']
+        if first:
+            first = False
+            if header['layer'] == 3 and is_info_frame(frame, header):
+                continue
+        yield frame, header
+
+
+def silence_frame(header):
+    if header['layer'] != 3:
+        raise ValueError("Silence padding is only supported for MPEG Layer III streams")
+    # Same stream parameters, no CRC, no padding; all-zero side info decodes to silence
+    length = header['length'] - header['padding']
+    frame = bytearray(length)
+    frame[0] = 0xFF
+    frame[1] = 0xE0 | (header['version'] << 3) | (1 << 1) | 1
+    bitrate_index = BITRATES[header['mpeg1']][3].index(header['bitrate'] // 1000)
+    sample_rate_index = SAMPLE_RATES[header['version']].index(header['sample_rate'])
+    frame[2] = (bitrate_index << 4) | (sample_rate_index << 2)
+    frame[3] = 0xC0 if header['mono'] else 0x00
+    return bytes(frame)
+
+
+def silence(header, seconds):
+    count = int(round(seconds * header['sample_rate'] / header['samples']))
+    return silence_frame(header) * count
+
+
+class LiveEpisode:
+    def __init__(self, path):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.condition = threading.Condition()
+        self.size = 0
+        self.done = False
+        self.failed = False
+
+
+# Episodes still being written, by filename, so /audio can stream them progressively
+live_episodes = {}
+live_episodes_lock = threading.Lock()
+
+
+class Mp3Writer:
+    def __init__(self, path, pause_seconds=0.0):
+        self.path = path
+        self.pause_seconds = pause_seconds
+        self.live = LiveEpisode(path)
+        self.frames_written = 0
+        self.segments_written = 0
+        self._header = None
+        self._file = open(self.live.part_path, 'wb')
+        with live_episodes_lock:
+            live_episodes[os.path.basename(path)] = self.live
+
+    def _write(self, data):
+        if not data:
+            return
+        self._file.write(data)
+        self._file.flush()
+        with self.live.condition:
+            self.live.size += len(data)
+            self.live.condition.notify_all()
+
+    def add_segment(self, mp3_bytes):
+        chunks = []
+        for frame, header in iter_frames(mp3_bytes):
+            if self._header is None:
+                self._header = header
+            chunks.append(frame)
+            self.frames_written += 1
+        if not chunks:
+            logger.warning(f"No MP3 frames found in segment {self.segments_written + 1} for {self.path}")
+            return
+        if self.segments_written and self.pause_seconds > 0:
+            chunks.insert(0, silence(self._header, self.pause_seconds))
+        self._write(b''.join(chunks))
+        self.segments_written += 1
+
+    def close(self):
+        self._file.close()
+        with live_episodes_lock:
+            os.replace(self.live.part_path, self.path)
+            live_episodes.pop(os.path.basename(self.path), None)
+        with self.live.condition:
+            self.live.done = True
+            self.live.condition.notify_all()
+
+    def abort(self):
+        self._file.close()
+        with live_episodes_lock:
+            live_episodes.pop(os.path.basename(self.path), None)
+            try:
+                os.remove(self.live.part_path)
+            except FileNotFoundError:
+                pass
+        with self.live.condition:
+            self.live.failed = True
+            self.live.done = True
+            self.live.condition.notify_all()
+
+
+def open_live_episode(filename):
+    # Open the in-progress file under the registry lock so a concurrent close() can't race the open
+    with live_episodes_lock:
+        live = live_episodes.get(filename)
+        if live is None:
+            return None, None
+        return live, open(live.part_path, 'rb')
+
+
+def stream_live_episode(live, f, block_size=64 * 1024, idle_timeout=120):
+    try:
+        sent = 0
+        while True:
+            data = f.read(block_size)
+            if data:
+                sent += len(data)
+                yield data
+                continue
+            with live.condition:
+                if live.size <= sent and not live.done:
+                    live.condition.wait(timeout=idle_timeout)
+                if live.size <= sent and (live.done or live.failed):
+                    break
+                if live.size <= sent:
+                    logger.warning(f"Gave up streaming {live.path} after {idle_timeout}s without new audio")
+                    break
+    finally:
+        f.close()
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Stories are compared as sets of overlapping word n-grams ("shingles"); Thai, written without
+# spaces between words, is shingled as character n-grams instead
+SHINGLE_WORDS = 3
+SHINGLE_THAI_CHARS = 4
+
+# MinHash signature length, split into LSH bands of MINHASH_PERMUTATIONS // LSH_BANDS rows.
+# 16 bands of 4 rows make two stories candidates once they share roughly half their shingles.
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+ROWS_PER_BAND = MINHASH_PERMUTATIONS // LSH_BANDS
+SIGNATURE_LAYOUT = struct.Struct(f'<{MINHASH_PERMUTATIONS}I')
+
+# Candidates whose estimated Jaccard similarity reaches this are the same story
+DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', 0.5))
+
+# Signatures are kept by article ID so each entry is only hashed once
+MAX_SIGNATURES = int(os.environ.get('STORY_INDEX_MAX_SIGNATURES', 20000))
+
+# Thai vowel and tone marks aren't \w, so Thai runs are matched as a whole script block
+TOKEN = re.compile(r'([\u0E00-\u0E7F]+)|\w+')
+MARKUP = re.compile(r'<[^>]*>')
+
+
+def shingles(text, size=SHINGLE_WORDS, thai_size=SHINGLE_THAI_CHARS):
+    # Feed descriptions often carry HTML; only the words count
+    text = unicodedata.normalize('NFKC', MARKUP.sub(' ', text or '')).casefold()
+    result = set()
+    words = []
+    for match in TOKEN.finditer(text):
+        thai = match.group(1)
+        if thai is None:
+            words.append(match.group(0))
+        elif len(thai) <= thai_size:
+            result.add(thai)
+        else:
+            result.update(thai[i:i + thai_size] for i in range(len(thai) - thai_size + 1))
+    if len(words) <= size:
+        if words:
+            result.add(' '.join(words))
+    else:
+        result.update(' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return result
+
+
+def minhash(shingle_set):
+    if not shingle_set:
+        return None
+    # One SHAKE digest per shingle gives all of its hash values at once (and the same ones in every process);
+    # the signature is their element-wise minimum over the shingles
+    rows = [SIGNATURE_LAYOUT.unpack(hashlib.shake_128(s.encode('utf-8')).digest(SIGNATURE_LAYOUT.size))
+            for s in shingle_set]
+    return tuple(map(min, zip(*rows)))
+
+
+def similarity(signature, other):
+    # Fraction of matching MinHash values estimates the Jaccard similarity of the shingle sets
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+class StoryIndex:
+    def __init__(self, threshold=DUPLICATE_THRESHOLD, max_signatures=MAX_SIGNATURES):
+        self.threshold = threshold
+        self.max_signatures = max_signatures
+        self._signatures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def signature(self, key, text):
+        with self._lock:
+            cached = self._signatures.get(key)
+            if cached is not None and cached[0] == text:
+                self._signatures.move_to_end(key)
+                return cached[1]
+        signature = minhash(shingles(text))
+        with self._lock:
+            self._signatures[key] = (text, signature)
+            self._signatures.move_to_end(key)
+            while len(self._signatures) > self.max_signatures:
+                self._signatures.popitem(last=False)
+        return signature
+
+    def cluster(self, items):
+        # items are (key, text) pairs; returns clusters as lists of indices, ordered by their first member
+        signatures = [self.signature(key, text) for key, text in items]
+        parent = list(range(len(items)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # Locality-sensitive hashing: only stories that collide in some band get compared
+        buckets = {}
+        for i, signature in enumerate(signatures):
+            if signature is None:
+                continue
+            for band in range(LSH_BANDS):
+                start = band * ROWS_PER_BAND
+                members = buckets.setdefault((band, signature[start:start + ROWS_PER_BAND]), [])
+                for j in members:
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j and similarity(signature, signatures[j]) >= self.threshold:
+                        # The earlier story stays the root, so it represents the cluster
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+                members.append(i)
+
+        clusters = OrderedDict()
+        for i in range(len(items)):
+            clusters.setdefault(find(i), []).append(i)
+        return list(clusters.values())
@@ -0,0 +1,76 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from mp3_audio import Mp3Writer, iter_frames, parse_frame_header, silence, silence_frame, strip_tags
+
+# 0.5 s of 440 Hz encoded by ffmpeg/libmp3lame the way Google TTS returns th-TH audio
+# (MPEG-2 Layer III, 24 kHz, 32 kbps, mono), with an ID3v2 tag, a LAME Info frame and an ID3v1 tag
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'tone_24khz_mono.mp3')
+
+# Audio packets in the fixture as counted by `ffmpeg -c copy -f framemd5`, which skips the Info frame
+FIXTURE_AUDIO_FRAMES = 23
+
+
+@pytest.fixture
+def fixture_mp3():
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+
+def test_strip_tags_removes_id3v2_and_id3v1(fixture_mp3):
+    assert fixture_mp3[:3] == b'ID3' and fixture_mp3[-128:-125] == b'TAG'
+    stripped = strip_tags(fixture_mp3)
+    assert parse_frame_header(stripped) is not None
+    assert b'TAG' not in stripped[-128:-125]
+    id3v2_size = (fixture_mp3[6] << 21) | (fixture_mp3[7] << 14) | (fixture_mp3[8] << 7) | fixture_mp3[9]
+    assert len(stripped) == len(fixture_mp3) - (10 + id3v2_size) - 128
+
+
+def test_iter_frames_matches_encoder_and_skips_info_frame(fixture_mp3):
+    frames = list(iter_frames(fixture_mp3))
+    assert len(frames) == FIXTURE_AUDIO_FRAMES
+    for frame, header in frames:
+        assert (header['layer'], header['sample_rate'], header['bitrate'], header['mono']) == (3, 24000, 32000, True)
+        assert len(frame) == header['length']
+        assert b'Info' not in frame and b'Xing' not in frame
+
+
+def test_silence_frame_round_trips_through_the_parser(fixture_mp3):
+    _, header = next(iter_frames(fixture_mp3))
+    frame = silence_frame(header)
+    parsed = parse_frame_header(frame)
+    for key in ('version', 'layer', 'bitrate', 'sample_rate', 'mono', 'samples'):
+        assert parsed[key] == header[key]
+    assert len(frame) == parsed['length'] and not parsed['crc']
+    # One second at 576 samples per frame
+    assert len(silence(header, 1.0)) == round(24000 / 576) * len(frame)
+
+
+def test_writer_splices_segments_frame_for_frame(tmp_path, fixture_mp3):
+    path = str(tmp_path / 'episode.mp3')
+    writer = Mp3Writer(path, pause_seconds=0.5)
+    writer.add_segment(fixture_mp3)
+    writer.add_segment(fixture_mp3)
+    writer.close()
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert not os.path.exists(f"{path}.part")
+    assert data[:3] != b'ID3' and b'Info' not in data and b'TAG' not in data
+    pause_frames = round(0.5 * 24000 / 576)
+    assert len(list(iter_frames(data))) == 2 * FIXTURE_AUDIO_FRAMES + pause_frames
+
+    if shutil.which('ffmpeg'):
+        result = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-f', 'null', '-'], capture_output=True, text=True)
+        assert result.returncode == 0 and not result.stderr
+
+
+def test_writer_abort_removes_partial_file(tmp_path, fixture_mp3):
+    path = str(tmp_path / 'episode.mp3')
+    writer = Mp3Writer(path)
+    writer.add_segment(fixture_mp3)
+    writer.abort()
+    assert not os.path.exists(path) and not os.path.exists(f"{path}.part")
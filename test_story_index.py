@@ -0,0 +1,30 @@
+from story_index import StoryIndex, minhash, shingles, similarity
+
+WIRE = ("Thailand's cabinet on Monday approved a 500 billion baht stimulus package to boost consumer "
+        "spending and revive an economy hit by weak exports, the finance minister told reporters in Bangkok.")
+REWRITE = ("Thailand's cabinet on Monday approved a 500 billion baht stimulus package to boost consumer "
+           "spending and revive an economy hurt by weak exports, the finance minister told reporters.")
+UNRELATED = ("Police in Chiang Mai arrested three suspects after a large seizure of methamphetamine pills "
+             "at a checkpoint near the Myanmar border early on Sunday morning.")
+
+THAI_WIRE = 'คณะรัฐมนตรีอนุมัติมาตรการกระตุ้นเศรษฐกิจวงเงิน 500,000 ล้านบาท เพื่อฟื้นฟูการบริโภคที่ชะลอตัว'
+THAI_REWRITE = 'คณะรัฐมนตรีอนุมัติมาตรการกระตุ้นเศรษฐกิจใหม่วงเงิน 500,000 ล้านบาท เพื่อฟื้นฟูการบริโภคที่กำลังชะลอตัว'
+
+
+def test_near_duplicates_cluster_and_unrelated_stories_do_not():
+    index = StoryIndex()
+    clusters = index.cluster([('a', WIRE), ('b', UNRELATED), ('c', REWRITE)])
+    assert clusters == [[0, 2], [1]]
+
+
+def test_unspaced_thai_near_duplicates_are_similar():
+    assert all(len(shingle) == 4 for shingle in shingles('ส่งสอบการร้องเรียน'))
+    assert similarity(minhash(shingles(THAI_WIRE)), minhash(shingles(THAI_REWRITE))) >= 0.5
+    assert similarity(minhash(shingles(THAI_WIRE)), minhash(shingles(UNRELATED))) < 0.1
+
+
+def test_signatures_are_cached_by_key_and_refreshed_when_text_changes():
+    index = StoryIndex()
+    first = index.signature('a', WIRE)
+    assert index.signature('a', WIRE) is first
+    assert index.signature('a', UNRELATED) != first
@@ -0,0 +1,45 @@
+from text_chunker import TTS_MAX_BYTES, chunk_text, hard_split, mid_syllable, pack_blocks, utf8_len
+
+# A real Thai sentence with no spaces, repeated well past the TTS byte limit
+THAI = 'นายกรัฐมนตรีประกาศมาตรการกระตุ้นเศรษฐกิจเพื่อฟื้นฟูเศรษฐกิจที่กำลังชะลอตัวในปีนี้'
+
+
+def test_unspaced_thai_fits_the_byte_budget_and_round_trips():
+    text = THAI * 60
+    chunks = chunk_text(text)
+    assert len(chunks) > 1
+    assert all(utf8_len(chunk) <= TTS_MAX_BYTES for chunk in chunks)
+    assert ''.join(chunks) == text
+
+
+def test_hard_split_never_cuts_next_to_a_combining_mark():
+    text = THAI * 10
+    pieces = hard_split(text, 200)
+    assert ''.join(pieces) == text
+    assert all(utf8_len(piece) <= 200 for piece in pieces)
+    offset = 0
+    for piece in pieces[:-1]:
+        offset += len(piece)
+        assert not mid_syllable(text, offset)
+
+
+def test_sentences_are_packed_greedily_with_separators_kept():
+    sentence = 'The government announced new measures today.'
+    text = ' '.join([sentence] * 300)
+    chunks = chunk_text(text)
+    assert all(utf8_len(chunk) <= TTS_MAX_BYTES for chunk in chunks)
+    assert ' '.join(chunks) == text
+    # Every chunk but the last is filled to within one sentence of the limit
+    assert all(utf8_len(chunk) > TTS_MAX_BYTES - utf8_len(sentence) - 1 for chunk in chunks[:-1])
+
+
+def test_pack_blocks_stays_under_the_limit_and_keeps_later_requests_stable():
+    stories = [f"ข่าวที่ {i} " + THAI * (1 + i % 4) for i in range(40)]
+    packed = pack_blocks(stories)
+    assert all(utf8_len(chunk) <= TTS_MAX_BYTES for chunk in packed)
+    assert len(packed) < len(stories)
+
+    edited = list(stories)
+    edited[5] += 'เพิ่มเติม'
+    changed = set(pack_blocks(edited)) - set(packed)
+    assert len(changed) <= 2
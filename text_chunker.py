@@ -0,0 +1,139 @@
+import hashlib
+import importlib.util
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Optional Thai word segmentation for long runs of Thai text with no spaces; it's a heavy import,
+# so it is only loaded the first time such a run turns up
+PYTHAINLP_AVAILABLE = importlib.util.find_spec('pythainlp') is not None
+
+# Google TTS rejects requests whose input text is over 5000 bytes
+TTS_MAX_BYTES = 5000
+
+# Sentence ends: after terminal punctuation, or a space between Thai characters
+# (Thai marks sentence and clause boundaries with a space, not punctuation)
+SENTENCE_BOUNDARY = re.compile('(?<=[.!?\u2026])\\s+|(?<=[\u0E00-\u0E7F])\\s+(?=[\u0E00-\u0E7F])')
+
+# Thai above/below vowels and tone marks attach to the preceding consonant,
+# and leading vowels attach to the following one; never cut next to them
+THAI_COMBINING = re.compile('[\u0E31\u0E34-\u0E3A\u0E47-\u0E4E]')
+THAI_LEADING_VOWELS = '\u0E40\u0E41\u0E42\u0E43\u0E44'
+
+
+def utf8_len(text):
+    return len(text.encode('utf-8'))
+
+
+def mid_syllable(text, i):
+    return bool(THAI_COMBINING.match(text[i])) or text[i - 1] in THAI_LEADING_VOWELS
+
+
+def hard_split(text, max_bytes):
+    # Last resort: cut on character boundaries, backing off so Thai syllables stay whole
+    pieces = []
+    start = 0
+    while start < len(text):
+        end = start
+        size = 0
+        while end < len(text):
+            char_size = utf8_len(text[end])
+            if size + char_size > max_bytes:
+                break
+            size += char_size
+            end += 1
+        if end < len(text):
+            cut = end
+            while cut > start + 1 and mid_syllable(text, cut):
+                cut -= 1
+            if not mid_syllable(text, cut):
+                end = cut
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+def split_word(word, max_bytes):
+    if PYTHAINLP_AVAILABLE:
+        from pythainlp.tokenize import word_tokenize
+        pieces = []
+        for token in word_tokenize(word, engine='newmm', keep_whitespace=False):
+            pieces.extend([token] if utf8_len(token) <= max_bytes else hard_split(token, max_bytes))
+        return pieces
+    return hard_split(word, max_bytes)
+
+
+def units(text, max_bytes):
+    # Yield (separator, text, byte size) units at the coarsest granularity that fits:
+    # sentences, then words, then Thai words or syllable-safe pieces
+    first = True
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        line_sep = '' if first else '\n'
+        first = False
+        for i, sentence in enumerate(SENTENCE_BOUNDARY.split(line)):
+            sep = line_sep if i == 0 else ' '
+            size = utf8_len(sentence)
+            if size <= max_bytes:
+                yield sep, sentence, size
+                continue
+            for j, word in enumerate(sentence.split()):
+                word_sep = sep if j == 0 else ' '
+                size = utf8_len(word)
+                if size <= max_bytes:
+                    yield word_sep, word, size
+                    continue
+                for k, piece in enumerate(split_word(word, max_bytes)):
+                    yield (word_sep if k == 0 else ''), piece, utf8_len(piece)
+
+
+def chunk_text(text, max_bytes=TTS_MAX_BYTES):
+    # Greedy fill in one pass: each unit is measured once and joined once
+    chunks = []
+    parts = []
+    size = 0
+    for sep, unit, unit_size in units(text, max_bytes):
+        sep_size = len(sep) if parts else 0
+        if parts and size + sep_size + unit_size > max_bytes:
+            chunks.append(''.join(parts))
+            parts = []
+            size = 0
+            sep_size = 0
+        parts.append(sep if parts else '')
+        parts.append(unit)
+        size += sep_size + unit_size
+    if parts:
+        chunks.append(''.join(parts))
+    return chunks
+
+
+def closes_group(block, group_size):
+    # Decided by the story's own text, not its position, so the groups after an edited story stay the same
+    return int(hashlib.sha1(block.encode('utf-8')).hexdigest()[:8], 16) % group_size == 0
+
+
+def pack_blocks(blocks, max_bytes=TTS_MAX_BYTES, group_size=8, separator='\n'):
+    # Fill requests with consecutive stories up to max_bytes, but only carry a request across
+    # the end of a story that doesn't close its group; about group_size stories share a request
+    chunks = []
+    parts = []
+    size = 0
+    for block in blocks:
+        for piece in chunk_text(block, max_bytes):
+            piece_size = utf8_len(piece)
+            if parts and size + len(separator) + piece_size > max_bytes:
+                chunks.append(separator.join(parts))
+                parts = []
+                size = 0
+            size += (len(separator) if parts else 0) + piece_size
+            parts.append(piece)
+        if parts and closes_group(block, group_size):
+            chunks.append(separator.join(parts))
+            parts = []
+            size = 0
+    if parts:
+        chunks.append(separator.join(parts))
+    return chunks
@@ -0,0 +1,99 @@
+import logging
+from clients import get_translate_client
+from translation_cache import translation_cache
+from metrics import TRANSLATE_CHARACTERS, TRANSLATE_REQUEST_SECONDS, TRANSLATE_REQUESTS, TRANSLATE_SEGMENTS
+
+logger = logging.getLogger(__name__)
+
+# Per-request limits for the Translate API
+MAX_BATCH_SEGMENTS = 128
+MAX_BATCH_CHARS = 30000
+
+def call_translate(values, target_lang, source_lang):
+    TRANSLATE_SEGMENTS.inc(1 if isinstance(values, str) else len(values))
+    TRANSLATE_CHARACTERS.inc(len(values) if isinstance(values, str) else sum(len(value) for value in values))
+    try:
+        with TRANSLATE_REQUEST_SECONDS.time():
+            result = get_translate_client().translate(values, target_language=target_lang, source_language=source_lang)
+    except Exception:
+        TRANSLATE_REQUESTS.labels('error').inc()
+        raise
+    TRANSLATE_REQUESTS.labels('ok').inc()
+    return result
+
+def translate_text(text, target_lang='th', source_lang=None):
+    cached = translation_cache.get(text, target_lang, source_lang)
+    if cached is not None:
+        return cached
+    try:
+        result = call_translate(text, target_lang, source_lang)
+        translation_cache.set(text, result['translatedText'], target_lang, source_lang)
+        return result['translatedText']
+    except Exception as e:
+        print(f"Translation error: {str(e)}")
+        return text  # Return original text if translation fails
+
+def pack_batches(texts, max_segments=MAX_BATCH_SEGMENTS, max_chars=MAX_BATCH_CHARS):
+    batches = []
+    current = []
+    current_chars = 0
+    for text in texts:
+        if current and (len(current) >= max_segments or current_chars + len(text) > max_chars):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        current.append(text)
+        current_chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+def translate_batch(texts, target_lang='th', source_lang=None):
+    results = [None] * len(texts)
+    pending = {}
+    for i, text in enumerate(texts):
+        cached = translation_cache.get(text, target_lang, source_lang)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(text, []).append(i)
+
+    for batch in pack_batches(list(pending)):
+        try:
+            translated = call_translate(batch, target_lang, source_lang)
+            for text, result in zip(batch, translated):
+                translation_cache.set(text, result['translatedText'], target_lang, source_lang)
+                for i in pending[text]:
+                    results[i] = result['translatedText']
+        except Exception as e:
+            logger.error("Batch translation error (%d segments): %s", len(batch), e)
+            for text in batch:
+                for i in pending[text]:
+                    results[i] = text  # Return original text if translation fails
+
+    return results
+
+def process_article(article):
+    try:
+        title = article['title']
+        content = article.get('content') or article.get('summary', '')
+
+        if not content.strip():
+            content = "No content available for this article."
+
+        logger.debug("Translating title: %s", title)
+        logger.debug("Translating content: %.100s...", content)
+        translated_title, translated_content = translate_batch([title, content])
+        logger.debug("Translated title: %s", translated_title)
+        logger.debug("Translated content: %.100s...", translated_content)
+
+        return {
+            'original_title': title,
+            'original_content': content,
+            'translated_title': translated_title,
+            'translated_content': translated_content,
+            'link': article['link']
+        }
+    except Exception as e:
+        print(f"Error in process_article: {str(e)}")  # Debug print
+        raise
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Where the persistent translation store lives (shared by the web app and Celery workers)
+CACHE_DIR = os.environ.get('SLOWNEWS_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+TRANSLATION_CACHE_PATH = os.environ.get('TRANSLATION_CACHE_PATH', os.path.join(CACHE_DIR, 'translations.sqlite3'))
+
+# Eviction limits
+MEMORY_MAX_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_MEMORY_ENTRIES', 2048))
+DISK_MAX_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_DISK_ENTRIES', 100000))
+MAX_AGE_SECONDS = int(os.environ.get('TRANSLATION_CACHE_MAX_AGE', 30 * 24 * 3600))
+
+# Run the on-disk eviction pass once every this many writes
+EVICT_EVERY_WRITES = 500
+
+# A disk hit only refreshes the row's access time (a write) if it is older than this
+TOUCH_INTERVAL_SECONDS = 3600
+
+
+def normalize_text(text):
+    # Same story text often differs only in whitespace or Unicode composition
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split())
+
+
+def cache_key(text, target_lang, source_lang=None):
+    payload = '\x00'.join([source_lang or 'auto', target_lang, normalize_text(text)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TranslationCache:
+    def __init__(self, path=TRANSLATION_CACHE_PATH, memory_max_entries=MEMORY_MAX_ENTRIES,
+                 disk_max_entries=DISK_MAX_ENTRIES, max_age_seconds=MAX_AGE_SECONDS):
+        self.path = path
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self.max_age_seconds = max_age_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # Under WAL this only gives up durability of the last commits on power loss, not consistency
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                ' key TEXT PRIMARY KEY,'
+                ' translated TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS translations_accessed ON translations (accessed_at)')
+            self._conn.commit()
+        return self._conn
+
+    def reset_connection(self):
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _remember(self, key, translated, created_at):
+        self._memory[key] = (translated, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, text, target_lang='th', source_lang=None):
+        key = cache_key(text, target_lang, source_lang)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.max_age_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    CACHE_LOOKUPS.labels('translation', 'memory_hit').inc()
+                    return entry[0]
+                del self._memory[key]
+
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    'SELECT translated, created_at, accessed_at FROM translations WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.max_age_seconds:
+                    # Eviction only needs a coarse LRU order, so most hits stay read-only
+                    if now - row[2] > TOUCH_INTERVAL_SECONDS:
+                        conn.execute('UPDATE translations SET accessed_at = ? WHERE key = ?', (now, key))
+                        conn.commit()
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    CACHE_LOOKUPS.labels('translation', 'disk_hit').inc()
+                    return row[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache read failed: {str(e)}")
+
+            self.misses += 1
+            CACHE_LOOKUPS.labels('translation', 'miss').inc()
+            return None
+
+    def set(self, text, translated, target_lang='th', source_lang=None):
+        key = cache_key(text, target_lang, source_lang)
+        now = time.time()
+        with self._lock:
+            self._remember(key, translated, now)
+            try:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO translations (key, translated, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                    (key, translated, now, now)
+                )
+                conn.commit()
+                self._writes += 1
+                if self._writes % EVICT_EVERY_WRITES == 0:
+                    self._evict(conn, now)
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache write failed: {str(e)}")
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM translations WHERE created_at < ?', (now - self.max_age_seconds,))
+        count = conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+        if count > self.disk_max_entries:
+            conn.execute(
+                'DELETE FROM translations WHERE key IN ('
+                ' SELECT key FROM translations ORDER BY accessed_at ASC LIMIT ?)',
+                (count - self.disk_max_entries,)
+            )
+        conn.commit()
+
+    def evict(self):
+        with self._lock:
+            self._evict(self._connect(), time.time())
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._connect()
+            conn.execute('DELETE FROM translations')
+            conn.commit()
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+        }
+
+
+translation_cache = TranslationCache()
+
+# SQLite connections must not be shared across fork (e.g. Celery prefork workers)
+os.register_at_fork(after_in_child=translation_cache.reset_connection)
@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from metrics import CACHE_LOOKUPS
+from translation_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Synthesized chunk audio, one file per (text, voice, language, rate, encoding)
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', os.path.join(CACHE_DIR, 'tts'))
+TTS_CACHE_MAX_BYTES = int(os.environ.get('TTS_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+
+def segment_key(text, voice_name, language_code, speaking_rate, audio_encoding):
+    payload = '\x00'.join([text, voice_name, language_code, repr(float(speaking_rate)), str(audio_encoding)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioSegmentCache:
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _entries(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.mp3'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _current_size(self):
+        # Call with self._lock held
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def size(self):
+        with self._lock:
+            return self._current_size()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # mtime doubles as the LRU clock
+            os.utime(path, None)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            CACHE_LOOKUPS.labels('tts', 'miss').inc()
+            return None
+        with self._lock:
+            self.hits += 1
+        CACHE_LOOKUPS.labels('tts', 'hit').inc()
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"TTS cache write failed: {str(e)}")
+            return
+        with self._lock:
+            # Replace and account under one lock so concurrent puts don't lose (or double count) bytes
+            current = self._current_size()
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            try:
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"TTS cache write failed: {str(e)}")
+                return
+            self._size = current - replaced + len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        # Drop least recently used segments until we're back under 90% of the cap
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * 0.9
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            self._size = total
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._size = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+tts_cache = AudioSegmentCache()